@@ -1,45 +1,187 @@
+import argparse
 import subprocess
 import os
+import queue
+import re
 import json
-import boto3
-from typing import Dict, List, Any
+import gzip
+import ipaddress
+import shutil
+import stat
+import logging
+import logging.handlers
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Any, Iterator, NamedTuple, Optional, Tuple
 import sys
 import time
 
-def fetch_vpc_resources(vpc_ids: List[str], region: str) -> Dict[str, Dict]:
-    """Fetch all VPC and associated resource details."""
-    ec2_client = boto3.client('ec2', region_name=region)
-    resource_details = {}
+try:
+    import fcntl
+except ImportError:  # Windows: lock with msvcrt instead
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# EC2 accepts at most 200 values per filter
+MAX_FILTER_VALUES = 200
+
+# Prefix lengths EC2 allows for a VPC IPv4 CIDR block
+VPC_PREFIX_LENGTHS = range(16, 29)
+
+def parse_cidr_selectors(cidrs: Optional[List[str]]) -> List[ipaddress.IPv4Network]:
+    """Validate --cidr values, raising ValueError for anything that is not an IPv4 CIDR."""
+    networks = []
+    for value in cidrs or []:
+        try:
+            network = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            raise ValueError(f"Invalid CIDR selector {value!r}; expected e.g. 10.0.0.0/16") from None
+        if network.version != 4:
+            raise ValueError(f"Only IPv4 CIDR selectors are supported, got {value!r}")
+        networks.append(network)
+    return networks
+
+def cidr_ranges_need_post_filter(networks: List[ipaddress.IPv4Network]) -> bool:
+    """True if any selector is wider than a VPC block and so can only be matched by containment."""
+    return any(network.prefixlen not in VPC_PREFIX_LENGTHS for network in networks)
+
+def vpc_in_cidr_ranges(vpc: Dict[str, Any], networks: List[ipaddress.IPv4Network]) -> bool:
+    """Whether any CIDR block associated with a described VPC lies inside one of `networks`."""
+    blocks = [
+        assoc['CidrBlock'] for assoc in vpc.get('CidrBlockAssociationSet', [])
+        if assoc.get('CidrBlockState', {}).get('State', 'associated') == 'associated'
+    ] or [vpc['CidrBlock']]
+    return any(
+        ipaddress.ip_network(block).subnet_of(network)
+        for block in blocks for network in networks
+    )
+
+def build_vpc_filters(tags: Optional[List[str]] = None, cidrs: Optional[List[str]] = None,
+                      is_default: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Translate VPC selectors into EC2 describe_vpcs Filters.
+
+    CIDR selectors that are valid VPC block sizes (/16 to /28) are exact-match server-side filters.
+    If any selector is wider, no CIDR filter is sent and fetch_vpc_resources matches all CIDR
+    selectors by containment instead.
+    """
+    networks = parse_cidr_selectors(cidrs)
+    filters = []
+    tag_values: Dict[str, List[str]] = {}
+    tag_keys = []
+    for tag in tags or []:
+        key, sep, value = tag.partition('=')
+        if sep:
+            tag_values.setdefault(key, []).append(value)
+        else:
+            tag_keys.append(key)
+    for key, values in tag_values.items():
+        filters.append({'Name': f'tag:{key}', 'Values': values})
+    if tag_keys:
+        filters.append({'Name': 'tag-key', 'Values': tag_keys})
+    if networks and not cidr_ranges_need_post_filter(networks):
+        filters.append({'Name': 'cidr-block-association.cidr-block', 'Values': [str(n) for n in networks]})
+    if is_default is not None:
+        filters.append({'Name': 'is-default', 'Values': ['true' if is_default else 'false']})
+    return filters
+
+def _chunks(values: List[str], size: int = MAX_FILTER_VALUES) -> Iterator[List[str]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+# describe_vpcs errors caused by a bad ID in VpcIds rather than by the request as a whole
+BAD_VPC_ID_ERRORS = ('InvalidVpcID.NotFound', 'InvalidVpcID.Malformed')
+
+def _describe_vpcs(ec2_client, vpc_ids: List[str],
+                   filters: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Describe VPCs in one paginated call, retrying ID by ID if any ID is stale or malformed."""
+    request = {}
+    if vpc_ids:
+        request['VpcIds'] = vpc_ids
+    if filters:
+        request['Filters'] = filters
+    try:
+        paginator = ec2_client.get_paginator('describe_vpcs')
+        return [vpc for page in paginator.paginate(**request) for vpc in page['Vpcs']]
+    except Exception as e:
+        code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+        if len(vpc_ids) < 2 or code not in BAD_VPC_ID_ERRORS:
+            raise
+        print(f"Warning: {str(e)}; looking up VPC IDs individually")
 
+    vpcs = []
     for vpc_id in vpc_ids:
-        resource_details[vpc_id] = {
-            'vpc': {},
-            'subnets': [],
-            'internet_gateways': [],
-            'nat_gateways': [],
-            'security_groups': [],
-            'route_tables': []
-        }
-
-        # Fetch VPC details with error handling
         try:
-            vpc_response = ec2_client.describe_vpcs(VpcIds=[vpc_id])
-            vpc = vpc_response['Vpcs'][0]
-            vpc_details = {
-                'cidr_block': vpc['CidrBlock'],
-                'tags': {tag['Key']: tag['Value'] for tag in vpc.get('Tags', [])},
-                'enable_dns_support': True,
-                'enable_dns_hostnames': True
-            }
-            resource_details[vpc_id]['vpc'] = vpc_details
+            vpcs.extend(_describe_vpcs(ec2_client, [vpc_id], filters))
         except Exception as e:
-            print(f"Error fetching VPC details: {str(e)}")
-            continue
+            print(f"Error fetching VPC details for {vpc_id}: {str(e)}")
+    return vpcs
+
+def fetch_vpc_resources(vpc_ids: List[str], region: str,
+                        filters: Optional[List[Dict[str, Any]]] = None,
+                        stats: Optional[Dict[str, int]] = None,
+                        cidrs: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Fetch all matching VPCs and associated resource details.
+
+    VPC selection is pushed down to EC2: `vpc_ids` and `filters` are passed to describe_vpcs,
+    and each child describe is issued once per batch of matching VPCs rather than once per VPC.
+    CIDR ranges that EC2 cannot filter on are applied to the described VPCs before any child
+    describes. If `stats` is given, its 'api_calls' entry is incremented for every EC2 request made.
+    """
+    networks = parse_cidr_selectors(cidrs)
+    cidr_ranges = networks if cidr_ranges_need_post_filter(networks) else []
+
+    # Imported lazily so subcommands that never touch AWS start fast
+    import boto3
+
+    # A session per call: the shared default session is not safe to use from several job threads
+    ec2_client = boto3.session.Session().client('ec2', region_name=region)
+    resource_details = {}
+
+    if stats is not None:
+        stats.setdefault('api_calls', 0)
+        stats.setdefault('errors', 0)
+
+        def _count_call(**kwargs):
+            stats['api_calls'] += 1
+
+        ec2_client.meta.events.register('before-call', _count_call)
+
+    # Fetch VPC details with error handling
+    try:
+        for vpc in _describe_vpcs(ec2_client, list(vpc_ids), filters):
+            if cidr_ranges and not vpc_in_cidr_ranges(vpc, cidr_ranges):
+                continue
+            resource_details[vpc['VpcId']] = {
+                'vpc': {
+                    'cidr_block': vpc['CidrBlock'],
+                    'tags': {tag['Key']: tag['Value'] for tag in vpc.get('Tags', [])},
+                    'enable_dns_support': True,
+                    'enable_dns_hostnames': True
+                },
+                'subnets': [],
+                'internet_gateways': [],
+                'nat_gateways': [],
+                'security_groups': [],
+                'route_tables': []
+            }
+    except Exception as e:
+        print(f"Error fetching VPC details: {str(e)}")
+        if stats is not None:
+            stats['errors'] += 1
+        return resource_details
 
+    for batch in _chunks(list(resource_details.keys())):
+        vpc_filter = [{'Name': 'vpc-id', 'Values': batch}]
         try:
             # Fetch Subnets
             paginator = ec2_client.get_paginator('describe_subnets')
-            for page in paginator.paginate(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]):
+            for page in paginator.paginate(Filters=vpc_filter):
                 for subnet in page['Subnets']:
                     subnet_details = {
                         'id': subnet['SubnetId'],
@@ -48,23 +190,26 @@ def fetch_vpc_resources(vpc_ids: List[str], region: str) -> Dict[str, Dict]:
                         'map_public_ip': subnet.get('MapPublicIpOnLaunch', False),
                         'tags': {tag['Key']: tag['Value'] for tag in subnet.get('Tags', [])}
                     }
-                    resource_details[vpc_id]['subnets'].append(subnet_details)
+                    resource_details[subnet['VpcId']]['subnets'].append(subnet_details)
 
             # Fetch Internet Gateways
-            igw_response = ec2_client.describe_internet_gateways(
-                Filters=[{'Name': 'attachment.vpc-id', 'Values': [vpc_id]}]
-            )
-            for igw in igw_response['InternetGateways']:
-                igw_details = {
-                    'id': igw['InternetGatewayId'],
-                    'tags': {tag['Key']: tag['Value'] for tag in igw.get('Tags', [])},
-                    'vpc_id': vpc_id
-                }
-                resource_details[vpc_id]['internet_gateways'].append(igw_details)
+            paginator = ec2_client.get_paginator('describe_internet_gateways')
+            for page in paginator.paginate(Filters=[{'Name': 'attachment.vpc-id', 'Values': batch}]):
+                for igw in page['InternetGateways']:
+                    for attachment in igw.get('Attachments', []):
+                        vpc_id = attachment.get('VpcId')
+                        if vpc_id not in resource_details:
+                            continue
+                        igw_details = {
+                            'id': igw['InternetGatewayId'],
+                            'tags': {tag['Key']: tag['Value'] for tag in igw.get('Tags', [])},
+                            'vpc_id': vpc_id
+                        }
+                        resource_details[vpc_id]['internet_gateways'].append(igw_details)
 
             # Fetch NAT Gateways
             paginator = ec2_client.get_paginator('describe_nat_gateways')
-            for page in paginator.paginate(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]):
+            for page in paginator.paginate(Filter=vpc_filter):
                 for nat in page['NatGateways']:
                     if nat['State'] != 'deleted':
                         nat_details = {
@@ -72,13 +217,13 @@ def fetch_vpc_resources(vpc_ids: List[str], region: str) -> Dict[str, Dict]:
                             'subnet_id': nat['SubnetId'],
                             'allocation_id': next((addr['AllocationId'] for addr in nat['NatGatewayAddresses']), None),
                             'tags': {tag['Key']: tag['Value'] for tag in nat.get('Tags', [])},
-                            'vpc_id': vpc_id
+                            'vpc_id': nat['VpcId']
                         }
-                        resource_details[vpc_id]['nat_gateways'].append(nat_details)
+                        resource_details[nat['VpcId']]['nat_gateways'].append(nat_details)
 
             # Fetch Security Groups
             paginator = ec2_client.get_paginator('describe_security_groups')
-            for page in paginator.paginate(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]):
+            for page in paginator.paginate(Filters=vpc_filter):
                 for sg in page['SecurityGroups']:
                     sg_details = {
                         'id': sg['GroupId'],
@@ -87,13 +232,13 @@ def fetch_vpc_resources(vpc_ids: List[str], region: str) -> Dict[str, Dict]:
                         'tags': {tag['Key']: tag['Value'] for tag in sg.get('Tags', [])},
                         'ingress_rules': sg.get('IpPermissions', []),
                         'egress_rules': sg.get('IpPermissionsEgress', []),
-                        'vpc_id': vpc_id
+                        'vpc_id': sg['VpcId']
                     }
-                    resource_details[vpc_id]['security_groups'].append(sg_details)
+                    resource_details[sg['VpcId']]['security_groups'].append(sg_details)
 
             # Fetch Route Tables
             paginator = ec2_client.get_paginator('describe_route_tables')
-            for page in paginator.paginate(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]):
+            for page in paginator.paginate(Filters=vpc_filter):
                 for rt in page['RouteTables']:
                     rt_details = {
                         'id': rt['RouteTableId'],
@@ -114,15 +259,95 @@ def fetch_vpc_resources(vpc_ids: List[str], region: str) -> Dict[str, Dict]:
                             }
                             for assoc in rt.get('Associations', [])
                         ],
-                        'vpc_id': vpc_id
+                        'vpc_id': rt['VpcId']
                     }
-                    resource_details[vpc_id]['route_tables'].append(rt_details)
+                    resource_details[rt['VpcId']]['route_tables'].append(rt_details)
 
         except Exception as e:
             print(f"Error fetching resources: {str(e)}")
+            if stats is not None:
+                stats['errors'] += 1
 
     return resource_details
 
+_process_locks: Dict[str, threading.Lock] = {}
+_process_locks_guard = threading.Lock()
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive advisory lock on `path` via a sidecar `<path>.lock` file.
+
+    Uses flock(2) on POSIX and msvcrt.locking on Windows, both of which serialize threads
+    and processes. Without either, only threads within this process are serialized.
+    """
+    lock_path = os.path.abspath(path) + '.lock'
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    if fcntl is not None:
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return
+
+    if msvcrt is not None:
+        with open(lock_path, 'a+') as lock_file:
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting like flock does
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+
+    with _process_locks_guard:
+        if not _process_locks:
+            print("Warning: no file locking available; concurrent imp.py processes are not serialized")
+        lock = _process_locks.setdefault(lock_path, threading.Lock())
+    with lock:
+        yield
+
+def _read_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Read once at import time: os.umask() can only be queried by setting it, which races with threads
+_UMASK = _read_umask()
+
+def atomic_write(path: str, content: str):
+    """Write `content` to a temporary file next to `path`, then rename it into place.
+
+    The file keeps the mode of the file it replaces, or gets the umask default for a new file,
+    rather than the 0600 that mkstemp uses.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 def create_terraform_files(parent_module: str, child_module: str):
     """Create minimal Terraform files focusing on VPC and Subnet resources."""
     parent_variables_tf = """
@@ -292,9 +517,15 @@ resource "aws_route_table" "imported_rt" {
   }
 }"""
 
+    # Terraform local module sources must be relative paths starting with ./ or ../
+    parent_source = os.path.relpath(os.path.abspath(parent_module), os.path.abspath(child_module))
+    parent_source = parent_source.replace(os.sep, '/')
+    if not parent_source.startswith('.'):
+        parent_source = f"./{parent_source}"
+
     child_main_tf = """
 module "vpc_resources" {
-  source = "../Parent_Module"
+  source = "PARENT_MODULE_SOURCE"
 
   aws_region     = var.aws_region
   vpc_configs    = var.vpc_configs
@@ -303,7 +534,7 @@ module "vpc_resources" {
   nat_configs    = var.nat_configs
   sg_configs     = var.sg_configs
   rt_configs     = var.rt_configs
-}"""
+}""".replace("PARENT_MODULE_SOURCE", parent_source)
 
     child_variables_tf = """
 variable "aws_region" {
@@ -389,45 +620,53 @@ variable "rt_configs" {
         (os.path.join(child_module, "main.tf"), child_main_tf),
         (os.path.join(child_module, "variables.tf"), child_variables_tf),
     ]:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as f:
-            f.write(content.strip())
+        with file_lock(path):
+            atomic_write(path, content.strip())
+
+TFVARS_CONFIG_TYPES = ['vpc_configs', 'subnet_configs', 'igw_configs', 'nat_configs', 'sg_configs', 'rt_configs']
+
+def read_tfvars(child_module: str) -> Dict[str, Any]:
+    """Parse terraform.tfvars as written by create_tfvars."""
+    tfvars_path = os.path.join(child_module, "terraform.tfvars")
+    configs = {config_type: {} for config_type in TFVARS_CONFIG_TYPES}
+    if not os.path.exists(tfvars_path):
+        return configs
+
+    try:
+        with open(tfvars_path, 'r') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Warning: Error reading existing tfvars file: {str(e)}")
+        return configs
+
+    # Parse existing configurations using string manipulation
+    for config_type in configs.keys():
+        start_marker = f"{config_type} = "
+        end_marker = "\n\n"
+        if start_marker in content:
+            start_idx = content.index(start_marker) + len(start_marker)
+            end_idx = content.find(end_marker, start_idx)
+            if end_idx == -1:  # If it's the last configuration
+                config_str = content[start_idx:].strip()
+            else:
+                config_str = content[start_idx:end_idx].strip()
+            try:
+                configs[config_type] = json.loads(config_str)
+            except json.JSONDecodeError:
+                print(f"Warning: Could not parse existing {config_type}")
+                configs[config_type] = {}
+    return configs
 
 def create_tfvars(child_module: str, resource_details: Dict, region: str):
     """Create or update terraform.tfvars with new VPC configurations while preserving existing ones."""
     tfvars_path = os.path.join(child_module, "terraform.tfvars")
-    existing_configs = {
-        'vpc_configs': {},
-        'subnet_configs': {},
-        'igw_configs': {},
-        'nat_configs': {},
-        'sg_configs': {},
-        'rt_configs': {}
-    }
+    # Hold the lock across read-merge-write so concurrent runs don't drop each other's VPCs
+    with file_lock(tfvars_path):
+        _update_tfvars(child_module, resource_details, region)
 
-    # Read existing configurations if file exists
-    if os.path.exists(tfvars_path):
-        try:
-            with open(tfvars_path, 'r') as f:
-                content = f.read()
-                # Parse existing configurations using string manipulation
-                for config_type in existing_configs.keys():
-                    start_marker = f"{config_type} = "
-                    end_marker = "\n\n"
-                    if start_marker in content:
-                        start_idx = content.index(start_marker) + len(start_marker)
-                        end_idx = content.find(end_marker, start_idx)
-                        if end_idx == -1:  # If it's the last configuration
-                            config_str = content[start_idx:].strip()
-                        else:
-                            config_str = content[start_idx:end_idx].strip()
-                        try:
-                            existing_configs[config_type] = json.loads(config_str)
-                        except json.JSONDecodeError:
-                            print(f"Warning: Could not parse existing {config_type}")
-                            existing_configs[config_type] = {}
-        except Exception as e:
-            print(f"Warning: Error reading existing tfvars file: {str(e)}")
+def _update_tfvars(child_module: str, resource_details: Dict, region: str):
+    tfvars_path = os.path.join(child_module, "terraform.tfvars")
+    existing_configs = read_tfvars(child_module)
 
     # Process new configurations
     vpc_configs = {}
@@ -571,163 +810,882 @@ sg_configs = {json.dumps(merged_configs['sg_configs'], indent=2)}
 rt_configs = {json.dumps(merged_configs['rt_configs'], indent=2)}
 """
 
-    with open(tfvars_path, 'w') as f:
-        f.write(tfvars_content)
+    atomic_write(tfvars_path, tfvars_content)
+
+class TerraformEvent(NamedTuple):
+    """A single typed event parsed from Terraform output."""
+    type: str
+    command: str
+    address: Optional[str] = None
+    level: str = 'info'
+    message: str = ''
+    detail: str = ''
+    timestamp: float = 0.0
+    cwd: str = ''
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+# Error events kept per address in the persisted failure index
+MAX_FAILURES_PER_ADDRESS = 20
+# Buffered output lines attached to a failed command that emitted no diagnostic
+FAILURE_CONTEXT_LINES = 20
+
+def failure_index_path(log_path: str) -> str:
+    return log_path + '.failures.json'
+
+def load_failure_index(log_path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Return the persisted {address: [error events]} index kept next to a run log."""
+    index_path = failure_index_path(log_path)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read failure index: {str(e)}")
+        return {}
+
+class _LockedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that several processes can share.
+
+    Each record is written under file_lock with the log reopened, so a rollover done by another
+    process is seen before writing and the .N.gz chain is only shifted by one process at a time.
+    """
+
+    def emit(self, record):
+        with file_lock(self.baseFilename):
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            super().emit(record)
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+
+class RunLog:
+    """Bounded in-memory event buffers plus a rotating, gzip-compressed JSON-lines log.
+
+    Error events are also kept in a small JSON index keyed by resource address, so a failed
+    import can be looked up after the run without scanning the log.
+    """
+
+    def __init__(self, path: str, max_events: int = 1000, max_commands: int = 256,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.path = path
+        self.max_events = max_events
+        self.max_commands = max_commands
+        self.buffers: 'OrderedDict[Tuple[str, str], deque]' = OrderedDict()
+        self.failures: 'OrderedDict[str, List[TerraformEvent]]' = OrderedDict()
+        self.index_path = failure_index_path(path)
+        self._indexed = set(load_failure_index(path))
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = _LockedRotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        handler.namer = lambda name: name + '.gz'
+        handler.rotator = _gzip_rotator
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self._logger = logging.getLogger(f"imp.runlog.{os.path.abspath(path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        for old_handler in list(self._logger.handlers):
+            self._logger.removeHandler(old_handler)
+            old_handler.close()
+        self._logger.addHandler(handler)
+
+    def start(self, command: str, cwd: str = ''):
+        """Open a fresh ring buffer for a command, evicting the oldest command if needed."""
+        with self._lock:
+            self.buffers.pop((cwd, command), None)
+            self.buffers[(cwd, command)] = deque(maxlen=self.max_events)
+            while len(self.buffers) > self.max_commands:
+                self.buffers.popitem(last=False)
+
+    def record(self, event: TerraformEvent):
+        """Append an event to its command buffer and to the on-disk log."""
+        with self._lock:
+            key = (event.cwd, event.command)
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = deque(maxlen=self.max_events)
+            buffer.append(event)
+            failure_key = event.address or event.command
+            is_failure = event.level == 'error' and event.type in ('diagnostic', 'command_failed')
+            if is_failure:
+                self.failures.setdefault(failure_key, []).append(event)
+                while len(self.failures) > self.max_commands:
+                    self.failures.popitem(last=False)
+            resolved = event.type == 'import_complete' and failure_key in self._indexed
+        self._logger.info(json.dumps(event.to_dict(), separators=(',', ':')))
+        if is_failure:
+            self._update_index(failure_key, event)
+        elif resolved:
+            self._update_index(failure_key, None)
+
+    def finish(self, command: str, cwd: str, ok: bool, address: Optional[str] = None):
+        """Record a failed command that produced no error diagnostic of its own."""
+        if ok:
+            return
+        with self._lock:
+            buffer = self.buffers.get((cwd, command), ())
+            if any(event.level == 'error' for event in buffer):
+                return
+            context = [event.message for event in buffer][-FAILURE_CONTEXT_LINES:]
+        self.record(TerraformEvent(
+            type='command_failed',
+            command=command,
+            address=address,
+            level='error',
+            message=f"Command failed: {command}",
+            detail='\n'.join(context),
+            timestamp=time.time(),
+            cwd=cwd
+        ))
+
+    def _update_index(self, key: str, event: Optional[TerraformEvent]):
+        """Add an error event to the persisted index, or drop `key` once it succeeds."""
+        with file_lock(self.index_path):
+            index = load_failure_index(self.path)
+            events = index.pop(key, [])
+            if event is not None:
+                index[key] = (events + [event.to_dict()])[-MAX_FAILURES_PER_ADDRESS:]
+            while len(index) > self.max_commands:
+                index.pop(next(iter(index)))
+            atomic_write(self.index_path, json.dumps(index, indent=2))
+        with self._lock:
+            self._indexed = set(index)
+
+    def diagnostics(self, address: Optional[str] = None) -> List[TerraformEvent]:
+        """Return error diagnostics, optionally only those for one resource address."""
+        with self._lock:
+            if address is not None:
+                return list(self.failures.get(address, []))
+            return [event for events in self.failures.values() for event in events]
+
+    def close(self):
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+            handler.close()
+
+def _gzip_rotator(source: str, dest: str):
+    """Compress a rotated run log segment."""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def read_run_log(path: str, event_type: Optional[str] = None,
+                 address: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield events from a run log and its compressed rotations, oldest first."""
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + '.'
+    rotated = sorted(
+        (name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.gz')),
+        key=lambda name: int(name[len(prefix):-3]) if name[len(prefix):-3].isdigit() else 0,
+        reverse=True
+    )
+    files = [os.path.join(directory, name) for name in rotated]
+    if os.path.exists(path):
+        files.append(path)
+
+    for file_path in files:
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if event_type is not None and event.get('type') != event_type:
+                    continue
+                if address is not None and event.get('address') != address:
+                    continue
+                yield event
+
+# Subcommands that support Terraform's streaming machine-readable UI (-json)
+JSON_STREAMING_SUBCOMMANDS = {'plan', 'apply', 'refresh', 'destroy'}
+# Terraform only accepts -json for these when they cannot prompt for approval
+APPROVAL_SUBCOMMANDS = {'apply', 'destroy'}
+
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+IMPORT_START_RE = re.compile(r'^(?P<address>\S+): Importing from ID "(?P<id>[^"]*)"')
+IMPORT_PREPARED_RE = re.compile(r'^(?P<address>\S+): Import prepared!')
+REFRESH_RE = re.compile(r'^(?P<address>\S+): Refreshing state\.\.\.')
+
+def _with_json_flag(command: List[str]) -> List[str]:
+    """Add -json to Terraform subcommands that can stream machine-readable output."""
+    if len(command) < 2 or command[1] not in JSON_STREAMING_SUBCOMMANDS or '-json' in command:
+        return command
+    if command[1] in APPROVAL_SUBCOMMANDS:
+        args = command[2:]
+        saved_plan = command[1] == 'apply' and any(not arg.startswith('-') for arg in args)
+        if '-auto-approve' not in args and not saved_plan:
+            return command
+    return command[:2] + ['-json'] + command[2:]
+
+def _import_address(command: List[str]) -> Optional[str]:
+    """Return the resource address targeted by a `terraform import` command."""
+    if len(command) > 1 and command[1] == 'import':
+        positional = [arg for arg in command[2:] if not arg.startswith('-')]
+        if positional:
+            return positional[0]
+    return None
+
+def parse_json_event(line: str, command: str, cwd: str = '') -> Optional[TerraformEvent]:
+    """Parse one line of `terraform -json` output into a TerraformEvent."""
+    try:
+        raw = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(raw, dict):
+        return None
+
+    hook = raw.get('hook') or raw.get('change') or {}
+    diagnostic = raw.get('diagnostic') or {}
+    resource = hook.get('resource') or {}
+    event_type = raw.get('type', 'log')
+    if event_type in ('apply_start', 'apply_complete', 'apply_errored') and hook.get('action') == 'import':
+        event_type = {'apply_start': 'import_start',
+                      'apply_complete': 'import_complete',
+                      'apply_errored': 'import_errored'}[event_type]
+
+    return TerraformEvent(
+        type=event_type,
+        command=command,
+        address=resource.get('addr') or diagnostic.get('address'),
+        level=diagnostic.get('severity') or raw.get('@level', 'info'),
+        message=diagnostic.get('summary') or raw.get('@message', ''),
+        detail=diagnostic.get('detail', ''),
+        timestamp=time.time(),
+        cwd=cwd
+    )
+
+def parse_text_event(line: str, command: str, address: Optional[str] = None,
+                     cwd: str = '') -> Optional[TerraformEvent]:
+    """Parse one line of human-readable Terraform output into a TerraformEvent."""
+    text = ANSI_ESCAPE_RE.sub('', line).strip().lstrip('\u2502\u2577\u2575').strip()
+    if not text:
+        return None
+
+    event_type, level = 'log', 'info'
+    match = IMPORT_START_RE.match(text) or IMPORT_PREPARED_RE.match(text) or REFRESH_RE.match(text)
+    if match:
+        address = match.group('address')
+        if match.re is IMPORT_START_RE:
+            event_type = 'import_start'
+        elif match.re is IMPORT_PREPARED_RE:
+            event_type = 'import_prepared'
+        else:
+            event_type = 'refresh_start'
+    elif text.startswith('Import successful!'):
+        event_type = 'import_complete'
+    elif text.startswith('Error: '):
+        event_type, level = 'diagnostic', 'error'
+        text = text[len('Error: '):]
+    elif text.startswith('Warning: '):
+        event_type, level = 'diagnostic', 'warning'
+        text = text[len('Warning: '):]
+
+    return TerraformEvent(
+        type=event_type,
+        command=command,
+        address=address,
+        level=level,
+        message=text,
+        timestamp=time.time(),
+        cwd=cwd
+    )
+
+# Seconds to let Terraform shut down gracefully after SIGTERM before it is killed
+TERMINATE_GRACE_SECONDS = 5
+
+def _stop_process(process: subprocess.Popen):
+    """Terminate a process, killing it if it has not exited within the grace period."""
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(TERMINATE_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
 
-def run_terraform_command(command: List[str], cwd: str, timeout: int = 300) -> bool:
-    """Run Terraform command with timeout and better error handling."""
+def _read_lines(stream, lines: 'queue.Queue'):
+    """Forward lines from `stream` to `lines`, then close it and send a None sentinel."""
+    try:
+        for line in stream:
+            lines.put(line)
+    except (OSError, ValueError):
+        pass
+    finally:
+        try:
+            stream.close()
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+class TextEventParser:
+    """Stateful parser for human-readable Terraform output.
+
+    Terraform draws each diagnostic as a box: an opening corner line, a `| Error: summary` line,
+    `|`-prefixed detail lines and a closing corner. The detail lines are collected into the
+    diagnostic's `detail`, and the diagnostic is emitted once the box closes.
+    """
+
+    def __init__(self, command: str, address: Optional[str] = None, cwd: str = ''):
+        self.command = command
+        self.address = address
+        self.cwd = cwd
+        self._pending: Optional[TerraformEvent] = None
+        self._detail: List[str] = []
+
+    def feed(self, line: str) -> List[TerraformEvent]:
+        text = ANSI_ESCAPE_RE.sub('', line).strip()
+        events = []
+        if self._pending is not None:
+            if text.startswith('\u2502'):
+                self._detail.append(text[1:].strip())
+                return events
+            events.extend(self.close())
+            if text.startswith('\u2575'):
+                return events
+
+        event = parse_text_event(line, self.command, self.address, self.cwd)
+        if event is not None and event.type == 'diagnostic' and text.startswith('\u2502'):
+            self._pending = event
+        elif event is not None:
+            events.append(event)
+        return events
+
+    def close(self) -> List[TerraformEvent]:
+        """Emit a diagnostic whose box was not closed before the output ended."""
+        if self._pending is None:
+            return []
+        event = self._pending._replace(detail='\n'.join(self._detail).strip())
+        self._pending, self._detail = None, []
+        return [event]
+
+def run_terraform_command(command: List[str], cwd: str, timeout: int = 300,
+                          run_log: Optional[RunLog] = None) -> bool:
+    """Run Terraform command with timeout, parsing its output into typed events.
+
+    Output is read on a helper thread so the timeout also holds when Terraform, or a child that
+    inherited its stdout, keeps the pipe open.
+    """
+    command = _with_json_flag(command)
+    json_mode = '-json' in command
+    command_str = ' '.join(command)
+    address = _import_address(command)
+    if run_log:
+        run_log.start(command_str, cwd)
+
+    ok = False
+    process = None
     try:
         process = subprocess.Popen(
             command,
             cwd=cwd,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             universal_newlines=True,
             bufsize=1
         )
 
-        print(f"\nExecuting: {' '.join(command)}")
-        
-        start_time = time.time()
+        print(f"\nExecuting: {command_str}")
+
+        lines: 'queue.Queue' = queue.Queue()
+        threading.Thread(target=_read_lines, args=(process.stdout, lines), daemon=True).start()
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        text_parser = TextEventParser(command_str, address, cwd)
+
+        def _emit(event: TerraformEvent):
+            if run_log:
+                run_log.record(event)
+
+            if event.type == 'diagnostic' and event.level == 'error':
+                print(f"ERROR: {event.message}", file=sys.stderr)
+                if event.detail:
+                    print(event.detail, file=sys.stderr)
+            else:
+                print(event.message)
+
         while True:
-            if process.poll() is not None:
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                timed_out = True
                 break
-            
-            if time.time() - start_time > timeout:
-                process.terminate()
-                print(f"Command timed out after {timeout} seconds")
-                return False
-            
-            output = process.stdout.readline()
-            error = process.stderr.readline()
-            
-            if output:
-                print(output.strip())
-            if error:
-                print(f"ERROR: {error.strip()}", file=sys.stderr)
-            
-            time.sleep(0.1)
+            if line is None:
+                break
+
+            event = None
+            if json_mode and line.lstrip().startswith('{'):
+                event = parse_json_event(line, command_str, cwd)
+            for parsed in [event] if event is not None else text_parser.feed(line):
+                _emit(parsed)
+
+        for event in text_parser.close():
+            _emit(event)
 
-        return_code = process.poll()
-        return return_code == 0
+        if not timed_out:
+            try:
+                return_code = process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+
+        if timed_out:
+            _stop_process(process)
+            print(f"Command timed out after {timeout} seconds")
+        else:
+            ok = return_code == 0
 
     except Exception as e:
         print(f"Error executing Terraform command: {str(e)}")
-        return False
+        if process is not None:
+            _stop_process(process)
+
+    if run_log:
+        run_log.finish(command_str, cwd, ok, address)
+    return ok
+
+# Import order: VPCs first, then their dependents, each as (resource_details key, resource address, label)
+IMPORT_RESOURCE_TYPES = [
+    ('subnets', 'module.vpc_resources.aws_subnet.imported_subnet', 'Subnet'),
+    ('internet_gateways', 'module.vpc_resources.aws_internet_gateway.imported_igw', 'Internet Gateway'),
+    ('nat_gateways', 'module.vpc_resources.aws_nat_gateway.imported_nat', 'NAT Gateway'),
+    ('security_groups', 'module.vpc_resources.aws_security_group.imported_sg', 'Security Group'),
+    ('route_tables', 'module.vpc_resources.aws_route_table.imported_rt', 'Route Table'),
+]
+VPC_ADDRESS = 'module.vpc_resources.aws_vpc.imported_vpc'
+
+def discovery_api_calls(vpc_count: int, region_count: int = 1) -> int:
+    """Minimum EC2 calls fetch_vpc_resources makes: one describe_vpcs per region plus
+    one describe per child resource type per batch of matching VPCs."""
+    batches = -(-vpc_count // MAX_FILTER_VALUES)
+    return region_count + len(IMPORT_RESOURCE_TYPES) * batches
+
+class ImportItem(NamedTuple):
+    """A single `terraform import` the importer would run."""
+    vpc_id: str
+    label: str
+    address: str
+    resource_id: str
+
+def managed_addresses(child_module: str) -> set:
+    """Return resource addresses already tracked in the child module's local state."""
+    state_path = os.path.join(child_module, "terraform.tfstate")
+    if not os.path.exists(state_path):
+        return set()
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read Terraform state: {str(e)}")
+        return set()
+
+    addresses = set()
+    for resource in state.get('resources', []):
+        if resource.get('mode') != 'managed':
+            continue
+        prefix = f"{resource['module']}." if resource.get('module') else ''
+        base = f"{prefix}{resource['type']}.{resource['name']}"
+        for instance in resource.get('instances', []):
+            index_key = instance.get('index_key')
+            addresses.add(base if index_key is None else f'{base}[{json.dumps(index_key)}]')
+    return addresses
+
+def build_import_plan(resource_details: Dict, already_managed: Optional[set] = None) -> List[ImportItem]:
+    """Compute the ordered set of imports for the given resources, skipping managed addresses."""
+    already_managed = already_managed or set()
+    plan = []
+    for vpc_id, resources in resource_details.items():
+        items = [ImportItem(vpc_id, 'VPC', f'{VPC_ADDRESS}["{vpc_id}"]', vpc_id)]
+        for key, address, label in IMPORT_RESOURCE_TYPES:
+            for resource in resources.get(key, []):
+                items.append(ImportItem(vpc_id, label, f'{address}["{resource["id"]}"]', resource['id']))
+        plan.extend(item for item in items if item.address not in already_managed)
+    return plan
+
+def import_resources(child_module: str, resource_details: Dict, run_log: Optional[RunLog] = None):
+    """Import VPC resources that are not yet tracked in Terraform state.
+
+    Terraform runs with `cwd=child_module`; the process working directory is never changed,
+    and the child module's state is locked for the duration of the import. Raises if
+    `terraform init` or any import fails, after attempting every import it can.
+    """
+    with file_lock(os.path.join(child_module, "terraform.tfstate")):
+        _import_resources(child_module, resource_details, run_log)
+
+def _import_resources(child_module: str, resource_details: Dict, run_log: Optional[RunLog] = None):
+    # Initialize Terraform with backend configuration
+    if not run_terraform_command(['terraform', 'init'], child_module, run_log=run_log):
+        raise Exception(f"Terraform initialization failed in {child_module}")
+
+    # VPCs come first in the plan; skip dependents of a VPC that failed to import
+    plan = build_import_plan(resource_details, managed_addresses(child_module))
+    failed_vpcs = set()
+    failed, skipped = 0, 0
+    for item in plan:
+        if item.vpc_id in failed_vpcs:
+            skipped += 1
+            continue
+        print(f"\nImporting {item.label} {item.resource_id}...")
+        if not run_terraform_command(
+            ['terraform', 'import', item.address, item.resource_id], child_module, run_log=run_log
+        ):
+            failed += 1
+            if item.label == 'VPC':
+                print(f"Warning: Failed to import VPC {item.vpc_id}")
+                failed_vpcs.add(item.vpc_id)
+
+    # Final plan with reduced complexity
+    # print("\nRunning final Terraform plan...")
+    # if run_terraform_command(['terraform', 'plan'], child_module, run_log=run_log):
+    #     print("\nApplying Terraform changes...")
+    #     run_terraform_command(['terraform', 'apply'], child_module, run_log=run_log)
+
+    if failed:
+        raise Exception(f"{failed} of {len(plan)} import(s) failed in {child_module}"
+                        + (f"; skipped {skipped} dependent resource(s)" if skipped else ""))
+
+def resource_details_from_tfvars(child_module: str) -> Dict[str, Dict]:
+    """Rebuild a minimal resource_details mapping from an existing terraform.tfvars."""
+    configs = read_tfvars(child_module)
+    resource_details = {
+        vpc_id: {'vpc': vpc, 'subnets': [], 'internet_gateways': [], 'nat_gateways': [],
+                 'security_groups': [], 'route_tables': []}
+        for vpc_id, vpc in configs['vpc_configs'].items()
+    }
+    subnet_vpcs = {subnet_id: subnet['vpc_id'] for subnet_id, subnet in configs['subnet_configs'].items()}
+
+    for config_type, key in [('subnet_configs', 'subnets'), ('igw_configs', 'internet_gateways'),
+                             ('nat_configs', 'nat_gateways'), ('sg_configs', 'security_groups'),
+                             ('rt_configs', 'route_tables')]:
+        for resource_id, config in configs[config_type].items():
+            vpc_id = config.get('vpc_id') or subnet_vpcs.get(config.get('subnet_id'))
+            if vpc_id in resource_details:
+                resource_details[vpc_id][key].append({'id': resource_id, **config})
+    return resource_details
+
+def print_dry_run(config: Dict[str, Any], resource_details: Dict, api_calls: int, estimated: bool = False):
+    """Print the imports, API calls and subprocesses an import run would cost."""
+    plan = build_import_plan(resource_details, managed_addresses(config['child_module']))
+    # terraform init plus one terraform import per address
+    subprocesses = 1 + len(plan)
+
+    for item in plan:
+        print(f"{item.address} {item.resource_id}")
+    print(f"\nDry run: {len(plan)} resource(s) to import")
+    print(f"AWS API calls: {api_calls}" + (" (minimum; extra pages add one call each)" if estimated else ""))
+    print(f"Terraform subprocesses: {subprocesses}")
+
+def dry_run(config: Dict[str, Any], offline: bool = False):
+    """Plan an import run without importing anything.
+
+    With a discovery file nothing is fetched. By default the VPCs are discovered with read-only
+    describe calls, so the plan is exact. `offline` reuses the last run's terraform.tfvars instead
+    and refuses selections it cannot answer from that file.
+    """
+    if config['resources']:
+        print_dry_run(config, load_resources(config), api_calls=0)
+        return
+
+    if offline:
+        known = resource_details_from_tfvars(config['child_module'])
+        missing = [vpc_id for vpc_id in config['vpc_ids'] if vpc_id not in known]
+        if missing:
+            raise Exception(f"VPC(s) not recorded in terraform.tfvars: {', '.join(missing)}; "
+                            f"run the dry run without --offline to discover them")
+        resource_details = select_known_vpcs(config, known)
+        print("Warning: offline plan uses terraform.tfvars; resources created since the last run are not shown")
+        print_dry_run(config, resource_details,
+                      discovery_api_calls(len(resource_details), len(config['regions'])), estimated=True)
+        return
+
+    if len(config['regions']) > 1:
+        raise Exception("Importing supports a single region; run `discover` for multi-region listings")
+    stats = {'api_calls': 0, 'errors': 0}
+    resource_details = fetch_vpc_resources(config['vpc_ids'], config['region'], config['filters'], stats,
+                                           cidrs=config['cidrs'])
+    if stats['errors']:
+        raise Exception("Discovery failed; the dry run would be incomplete")
+    print_dry_run(config, resource_details, stats['api_calls'])
+
+DEFAULT_CONFIG = {
+    'region': "us-east-1",
+    'regions': None,
+    'vpc_ids': ["vpc-0deb766aa06396f05", "vpc-0ac3883de5bde45b6"],
+    'tags': [],
+    'cidrs': [],
+    'is_default': None,
+    'parent_module': "Parent_Module",
+    'child_module': "Child_Module",
+    'run_log': "terraform_run.jsonl",
+    'resources': None,
+    'jobs': [],
+    'max_workers': 4,
+}
+
+PATH_KEYS = ('parent_module', 'child_module', 'run_log', 'resources')
+
+def _resolve_paths(values: Dict[str, Any], base_path: str) -> Dict[str, Any]:
+    """Return `values` with relative path settings joined onto `base_path`."""
+    return {
+        key: os.path.join(base_path, value) if key in PATH_KEYS and value else value
+        for key, value in values.items()
+    }
+
+def load_config(args: argparse.Namespace) -> Dict[str, Any]:
+    """Merge defaults, an optional JSON config file and command-line flags.
+
+    Relative paths resolve against the script directory for defaults, the config file's
+    directory for config file values (including `jobs`), and the current directory for flags.
+    """
+    config = _resolve_paths(DEFAULT_CONFIG, os.path.abspath(os.path.dirname(__file__)))
+    explicit = set()
+    if args.config:
+        config_dir = os.path.dirname(os.path.abspath(args.config))
+        with open(args.config, 'r') as f:
+            file_config = _resolve_paths(json.load(f), config_dir)
+        file_config['jobs'] = [_resolve_paths(job, config_dir) for job in file_config.get('jobs', [])]
+        config.update(file_config)
+        explicit.update(file_config)
+
+    for key in DEFAULT_CONFIG:
+        value = getattr(args, key, None)
+        if value is not None:
+            config[key] = os.path.abspath(value) if key in PATH_KEYS else value
+            explicit.add(key)
+
+    # Selectors replace the default VPC list unless VPC IDs were given explicitly
+    has_selectors = config['tags'] or config['cidrs'] or config['is_default'] is not None
+    if has_selectors and 'vpc_ids' not in explicit:
+        config['vpc_ids'] = []
+
+    config['regions'] = config['regions'] or [config['region']]
+    config['region'] = config['regions'][0]
+    config['filters'] = build_vpc_filters(config['tags'], config['cidrs'], config['is_default'])
+    return config
+
+def load_resources(config: Dict[str, Any]) -> Dict[str, Dict]:
+    """Load resource details from a discovery file, or fetch them from AWS."""
+    if config['resources']:
+        with open(config['resources'], 'r') as f:
+            return json.load(f)
+    if len(config['regions']) > 1:
+        raise Exception("Importing supports a single region; run `discover` for multi-region listings")
+    print("Fetching VPC details...")
+    return fetch_vpc_resources(config['vpc_ids'], config['region'], config['filters'], cidrs=config['cidrs'])
+
+def select_known_vpcs(config: Dict[str, Any], known: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Apply VPC IDs and tag selectors to resources recorded in terraform.tfvars.
+
+    Matches the EC2 filters from build_vpc_filters: values for one tag key are OR'ed, bare keys
+    match if any is present, and different filters are AND'ed. terraform.tfvars records neither
+    secondary CIDR associations nor whether a VPC is the default, so those selectors are refused.
+    """
+    if config['cidrs'] or config['is_default'] is not None:
+        raise Exception("--cidr and --is-default cannot be evaluated offline; "
+                        "run the dry run without --offline")
+
+    candidates = known
+    if config['vpc_ids']:
+        candidates = {vpc_id: known[vpc_id] for vpc_id in config['vpc_ids'] if vpc_id in known}
+
+    filters = build_vpc_filters(config['tags'])
+    selected = {}
+    for vpc_id, resources in candidates.items():
+        tags = resources['vpc'].get('tags', {})
+        if all(
+            any(key in tags for key in flt['Values']) if flt['Name'] == 'tag-key'
+            else tags.get(flt['Name'][len('tag:'):]) in flt['Values']
+            for flt in filters
+        ):
+            selected[vpc_id] = resources
+    return selected
+
+def cmd_discover(config: Dict[str, Any], args: argparse.Namespace):
+    by_region = {
+        region: fetch_vpc_resources(config['vpc_ids'], region, config['filters'], cidrs=config['cidrs'])
+        for region in config['regions']
+    }
+    # A single region keeps the flat layout that --resources expects
+    result = by_region[config['region']] if len(by_region) == 1 else by_region
+    output = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+def cmd_generate(config: Dict[str, Any], args: argparse.Namespace):
+    print("Creating Terraform files...")
+    create_terraform_files(config['parent_module'], config['child_module'])
+    if config['resources']:
+        print("Updating terraform.tfvars...")
+        create_tfvars(config['child_module'], load_resources(config), config['region'])
+
+def run_import(config: Dict[str, Any], run_log: Optional[RunLog] = None):
+    """Discover, write tfvars and import resources for one child module."""
+    parent_module, child_module = config['parent_module'], config['child_module']
+
+    # Create Terraform files only if they don't exist
+    if not os.path.exists(parent_module) or not os.path.exists(child_module):
+        print("Creating Terraform files...")
+        create_terraform_files(parent_module, child_module)
+
+    # Fetch VPC details
+    resource_details = load_resources(config)
+
+    # Create/Update tfvars
+    print("Updating terraform.tfvars...")
+    create_tfvars(child_module, resource_details, config['region'])
+
+    # Import resources
+    print("Importing resources...")
+    import_resources(child_module, resource_details, run_log)
+
+def job_config(config: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    """Overlay one entry of the `jobs` config list (paths already resolved) on the base configuration."""
+    merged = {**config, **job, 'jobs': []}
+    if 'region' in job and 'regions' not in job:
+        merged['regions'] = [job['region']]
+    merged['region'] = merged['regions'][0]
+    if any(key in job for key in ('tags', 'cidrs', 'is_default')):
+        merged['filters'] = build_vpc_filters(merged['tags'], merged['cidrs'], merged['is_default'])
+        if 'vpc_ids' not in job:
+            merged['vpc_ids'] = []
+    return merged
+
+def run_import_jobs(jobs: List[Dict[str, Any]], run_job: Callable[[Dict[str, Any]], None],
+                    max_workers: int = 4) -> List[Tuple[Dict[str, Any], Exception]]:
+    """Run jobs concurrently, serializing only jobs that share a child module.
+
+    Jobs are queued per child module in submission order; each queue runs on its own worker,
+    so independent modules proceed in parallel while file locks guard shared files
+    such as the parent module. Returns the (job, exception) pairs of jobs that failed.
+    """
+    queues: 'OrderedDict[str, List[Dict[str, Any]]]' = OrderedDict()
+    for job in jobs:
+        queues.setdefault(os.path.realpath(job['child_module']), []).append(job)
+
+    failures = []
+
+    def _drain(queue: List[Dict[str, Any]]):
+        for job in queue:
+            try:
+                run_job(job)
+            except Exception as e:
+                print(f"Error in job for {job['child_module']}: {str(e)}")
+                failures.append((job, e))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(_drain, queue) for queue in queues.values()]:
+            future.result()
+    return failures
+
+def cmd_import(config: Dict[str, Any], args: argparse.Namespace):
+    jobs = [job_config(config, job) for job in config['jobs']] or [config]
 
-def import_resources(child_module: str, resource_details: Dict):
-    """Import VPC and Subnet resources with improved error handling."""
+    if args.dry_run:
+        for job in jobs:
+            if len(jobs) > 1:
+                print(f"\n# {job['child_module']}")
+            dry_run(job, args.offline)
+        return
+
+    run_log = RunLog(config['run_log'])
     try:
-        os.chdir(child_module)
-        
-        # Initialize Terraform with backend configuration
-        if not run_terraform_command(['terraform', 'init'], child_module):
-            raise Exception("Terraform initialization failed")
-
-        # Import VPCs first
-        for vpc_id in resource_details.keys():
-            print(f"\nImporting VPC {vpc_id}...")
-            if not run_terraform_command([
-                'terraform', 'import',
-                f'module.vpc_resources.aws_vpc.imported_vpc["{vpc_id}"]',
-                vpc_id
-            ], child_module):
-                print(f"Warning: Failed to import VPC {vpc_id}")
-                continue
+        failed_jobs = run_import_jobs(jobs, lambda job: run_import(job, run_log), config['max_workers'])
+    finally:
+        run_log.close()
 
-            # Import associated subnets
-            for subnet in resource_details[vpc_id]['subnets']:
-                subnet_id = subnet['id']
-                print(f"Importing Subnet {subnet_id}...")
-                run_terraform_command([
-                    'terraform', 'import',
-                    f'module.vpc_resources.aws_subnet.imported_subnet["{subnet_id}"]',
-                    subnet_id
-                ], child_module)
-                
-            # Import Internet Gateways
-            for igw in resource_details[vpc_id]['internet_gateways']:
-                igw_id = igw['id']
-                print(f"\nImporting Internet Gateway {igw_id}...")
-                import_cmd = [
-                    'terraform', 'import',
-                    f'module.vpc_resources.aws_internet_gateway.imported_igw["{igw_id}"]',
-                    igw_id
-                ]
-                run_terraform_command(import_cmd, child_module)
-
-            # Import NAT Gateways
-            for nat in resource_details[vpc_id]['nat_gateways']:
-                nat_id = nat['id']
-                print(f"\nImporting NAT Gateway {nat_id}...")
-                import_cmd = [
-                    'terraform', 'import',
-                    f'module.vpc_resources.aws_nat_gateway.imported_nat["{nat_id}"]',
-                    nat_id
-                ]
-                run_terraform_command(import_cmd, child_module)
-
-            # Import Security Groups
-            for sg in resource_details[vpc_id]['security_groups']:
-                sg_id = sg['id']
-                print(f"\nImporting Security Group {sg_id}...")
-                import_cmd = [
-                    'terraform', 'import',
-                    f'module.vpc_resources.aws_security_group.imported_sg["{sg_id}"]',
-                    sg_id
-                ]
-                run_terraform_command(import_cmd, child_module)
-
-            # Import Route Tables
-            for rt in resource_details[vpc_id]['route_tables']:
-                rt_id = rt['id']
-                print(f"\nImporting Route Table {rt_id}...")
-                import_cmd = [
-                    'terraform', 'import',
-                    f'module.vpc_resources.aws_route_table.imported_rt["{rt_id}"]',
-                    rt_id
-                ]
-                run_terraform_command(import_cmd, child_module)
-
-        # Final plan with reduced complexity
-        # print("\nRunning final Terraform plan...")
-        # if run_terraform_command(['terraform', 'plan'], child_module):
-        #     print("\nApplying Terraform changes...")
-        #     run_terraform_command(['terraform', 'apply'], child_module)
-            
-    except Exception as e:
-        print(f"Error during import: {str(e)}")
+    # Summarize failed imports from the in-memory diagnostics index
+    for failure in run_log.diagnostics():
+        print(f"Import failed for {failure.address or failure.command}: {failure.message}")
+
+    if failed_jobs:
+        raise Exception(f"{len(failed_jobs)} of {len(jobs)} import job(s) failed")
+
+def cmd_plan(config: Dict[str, Any], args: argparse.Namespace):
+    run_log = RunLog(config['run_log'])
+    try:
+        ok = run_terraform_command(['terraform', 'plan'], config['child_module'], run_log=run_log)
     finally:
-        os.chdir(os.path.dirname(child_module))
+        run_log.close()
+    if not ok:
+        sys.exit(1)
 
-def main():
-    """Main function with improved error handling and simplified resource management."""
+def cmd_log(config: Dict[str, Any], args: argparse.Namespace):
+    if args.failed:
+        index = load_failure_index(config['run_log'])
+        events = index.get(args.address, []) if args.address else [e for v in index.values() for e in v]
+    else:
+        events = read_run_log(config['run_log'], args.type, args.address)
+    for event in events:
+        print(json.dumps(event))
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Import existing AWS VPC resources into Terraform.")
+    parser.add_argument('--config', help="JSON config file (keys: region, regions, vpc_ids, tags, cidrs, "
+                                         "is_default, parent_module, child_module, run_log, resources, jobs, max_workers)")
+    parser.add_argument('--region', dest='regions', action='append',
+                        help="AWS region (repeatable for discover)")
+    parser.add_argument('--vpc-id', dest='vpc_ids', action='append', help="VPC ID (repeatable)")
+    parser.add_argument('--tag', dest='tags', action='append',
+                        help="Select VPCs by tag KEY=VALUE, or KEY to match any value (repeatable)")
+    parser.add_argument('--cidr', dest='cidrs', action='append',
+                        help="Select VPCs by associated IPv4 CIDR block (repeatable): /16-/28 values match "
+                             "exactly, wider ranges such as 10.0.0.0/8 match blocks inside them")
+    parser.add_argument('--is-default', dest='is_default', choices=['true', 'false'],
+                        help="Select only default (true) or non-default (false) VPCs")
+    parser.add_argument('--parent-module', help="Parent module directory")
+    parser.add_argument('--child-module', help="Child module directory")
+    parser.add_argument('--run-log', help="Path of the JSON-lines run log")
+    parser.add_argument('--resources', help="Resource details JSON written by `discover` (skips AWS calls)")
+    parser.add_argument('--max-workers', type=int,
+                        help="Concurrent import jobs when the config file lists `jobs`")
+
+    subparsers = parser.add_subparsers(dest='command')
+    discover = subparsers.add_parser('discover', help="Fetch VPC resource details from AWS")
+    discover.add_argument('-o', '--output', help="Write resource details JSON to this file")
+    discover.set_defaults(func=cmd_discover)
+
+    generate = subparsers.add_parser('generate', help="Write module files (and tfvars with --resources)")
+    generate.set_defaults(func=cmd_generate)
+
+    import_ = subparsers.add_parser('import', help="Discover, write tfvars and import resources")
+    import_.add_argument('--dry-run', action='store_true',
+                         help="Show the addresses to import and the API calls and subprocesses it would cost; "
+                              "only read-only describe calls are made")
+    import_.add_argument('--offline', action='store_true',
+                         help="With --dry-run, plan from terraform.tfvars instead of describing VPCs")
+    import_.set_defaults(func=cmd_import)
+
+    plan = subparsers.add_parser('plan', help="Run terraform plan in the child module")
+    plan.set_defaults(func=cmd_plan)
+
+    log = subparsers.add_parser('log', help="Query the JSON-lines run log")
+    log.add_argument('--failed', action='store_true',
+                     help="Show errors from the failure index instead of scanning the log")
+    log.add_argument('--address', help="Only events for this resource address")
+    log.add_argument('--type', help="Only events of this type (full log scan)")
+    log.set_defaults(func=cmd_log)
+
+    parser.set_defaults(func=cmd_import, dry_run=False, offline=False, output=None)
+    return parser
+
+def main(argv: Optional[List[str]] = None):
+    """Command-line entry point; runs a full import when no subcommand is given."""
+    args = build_parser().parse_args(argv)
+    if args.is_default is not None:
+        args.is_default = args.is_default == 'true'
     try:
-        base_path = os.path.abspath(os.path.dirname(__file__))
-        parent_module = os.path.join(base_path, "Parent_Module")
-        child_module = os.path.join(base_path, "Child_Module")
-        
-        # Configuration
-        region = "us-east-1"
-        vpc_ids = ["vpc-0deb766aa06396f05","vpc-0ac3883de5bde45b6"]  # Add your new VPC IDs here 
-        
-        # Create Terraform files only if they don't exist
-        if not os.path.exists(parent_module) or not os.path.exists(child_module):
-            print("Creating Terraform files...")
-            create_terraform_files(parent_module, child_module)
-        
-        # Fetch VPC details
-        print("Fetching VPC details...")
-        resource_details = fetch_vpc_resources(vpc_ids, region)
-        
-        # Create/Update tfvars
-        print("Updating terraform.tfvars...")
-        create_tfvars(child_module, resource_details, region)
-        
-        # Import resources
-        print("Importing resources...")
-        import_resources(child_module, resource_details)
-        
+        config = load_config(args)
+        args.func(config, args)
     except Exception as e:
         print(f"Error in main: {str(e)}")
         sys.exit(1)
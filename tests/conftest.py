@@ -0,0 +1,117 @@
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_script():
+    # imp.py shadows the stdlib `imp` module name, so load it from its path
+    spec = importlib.util.spec_from_file_location("imp_script", os.path.join(ROOT, "imp.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def imp():
+    return _load_script()
+
+
+class FakeClientError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class _Events:
+    def __init__(self):
+        self.handlers = []
+
+    def register(self, name, handler):
+        self.handlers.append(handler)
+
+
+class _Paginator:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def paginate(self, **kwargs):
+        yield self.client.call(self.name, **kwargs)
+
+
+class FakeEC2:
+    """In-memory stand-in for the handful of EC2 describe calls imp.py makes."""
+
+    RESULT_KEYS = {
+        'describe_vpcs': 'Vpcs',
+        'describe_subnets': 'Subnets',
+        'describe_internet_gateways': 'InternetGateways',
+        'describe_nat_gateways': 'NatGateways',
+        'describe_security_groups': 'SecurityGroups',
+        'describe_route_tables': 'RouteTables',
+    }
+
+    def __init__(self):
+        self.meta = type('Meta', (), {'events': _Events()})()
+        self.calls = []
+        self.data = {name: [] for name in self.RESULT_KEYS}
+
+    def add_vpc(self, vpc_id, cidr='10.0.0.0/16', tags=None, is_default=False, extra_cidrs=()):
+        self.data['describe_vpcs'].append({
+            'VpcId': vpc_id, 'CidrBlock': cidr, 'IsDefault': is_default,
+            'Tags': [{'Key': k, 'Value': v} for k, v in (tags or {}).items()],
+            'CidrBlockAssociationSet': [{'CidrBlock': c} for c in (cidr,) + tuple(extra_cidrs)],
+        })
+        self.data['describe_subnets'].append({
+            'SubnetId': f'subnet-{vpc_id}', 'VpcId': vpc_id, 'CidrBlock': cidr, 'AvailabilityZone': 'us-east-1a',
+        })
+
+    def get_paginator(self, name):
+        return _Paginator(self, name)
+
+    def call(self, name, VpcIds=None, Filters=None, Filter=None):
+        for handler in self.meta.events.handlers:
+            handler()
+        self.calls.append((name, VpcIds, Filters or Filter))
+        items = self.data[name]
+        if VpcIds is not None:
+            known = {item['VpcId'] for item in items}
+            missing = [vpc_id for vpc_id in VpcIds if vpc_id not in known]
+            if missing:
+                raise FakeClientError('InvalidVpcID.NotFound', f"The vpc ID '{', '.join(missing)}' does not exist")
+            items = [item for item in items if item['VpcId'] in VpcIds]
+        for flt in Filters or Filter or []:
+            items = [item for item in items if _matches(item, flt['Name'], flt['Values'])]
+        return {self.RESULT_KEYS[name]: items}
+
+
+def _matches(item, name, values):
+    tags = {tag['Key']: tag['Value'] for tag in item.get('Tags', [])}
+    if name in ('vpc-id', 'attachment.vpc-id'):
+        return item.get('VpcId') in values
+    if name.startswith('tag:'):
+        return tags.get(name[4:]) in values
+    if name == 'tag-key':
+        return any(key in tags for key in values)
+    if name == 'cidr-block-association.cidr-block':
+        return any(assoc['CidrBlock'] in values for assoc in item['CidrBlockAssociationSet'])
+    if name == 'is-default':
+        return ('true' if item['IsDefault'] else 'false') in values
+    raise AssertionError(f"unsupported filter {name}")
+
+
+@pytest.fixture
+def fake_ec2(monkeypatch):
+    client = FakeEC2()
+    boto3 = types.ModuleType('boto3')
+    boto3.session = types.SimpleNamespace(
+        Session=lambda: types.SimpleNamespace(client=lambda service, region_name=None: client)
+    )
+    monkeypatch.setitem(sys.modules, 'boto3', boto3)
+    return client
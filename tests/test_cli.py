@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def child_module(tmp_path):
+    path = tmp_path / "Child_Module"
+    path.mkdir()
+    return path
+
+
+def _run(imp, capsys, *argv):
+    imp.main(list(argv))
+    return capsys.readouterr().out
+
+
+def test_dry_run_discovers_new_vpc(imp, fake_ec2, child_module, capsys):
+    fake_ec2.add_vpc("vpc-brandnew")
+    out = _run(imp, capsys, "--child-module", str(child_module), "--vpc-id", "vpc-brandnew", "import", "--dry-run")
+
+    assert 'module.vpc_resources.aws_vpc.imported_vpc["vpc-brandnew"] vpc-brandnew' in out
+    assert 'module.vpc_resources.aws_subnet.imported_subnet["subnet-vpc-brandnew"]' in out
+    assert "Dry run: 2 resource(s) to import" in out
+    assert f"AWS API calls: {len(fake_ec2.calls)}\n" in out
+    assert "Terraform subprocesses: 3" in out
+    assert [call[0] for call in fake_ec2.calls if call[0] != "describe_vpcs"] == [
+        "describe_subnets", "describe_internet_gateways", "describe_nat_gateways",
+        "describe_security_groups", "describe_route_tables"]
+
+
+def test_dry_run_skips_addresses_in_state(imp, fake_ec2, child_module, capsys):
+    fake_ec2.add_vpc("vpc-1")
+    (child_module / "terraform.tfstate").write_text(json.dumps({"resources": [{
+        "module": "module.vpc_resources", "mode": "managed", "type": "aws_vpc", "name": "imported_vpc",
+        "instances": [{"index_key": "vpc-1"}],
+    }]}))
+    out = _run(imp, capsys, "--child-module", str(child_module), "--vpc-id", "vpc-1", "import", "--dry-run")
+
+    assert "imported_vpc" not in out
+    assert "Dry run: 1 resource(s) to import" in out
+
+
+def test_offline_dry_run_refuses_unknown_vpc(imp, child_module, capsys):
+    with pytest.raises(SystemExit) as exc:
+        imp.main(["--child-module", str(child_module), "--vpc-id", "vpc-brandnew", "import", "--dry-run", "--offline"])
+    assert exc.value.code == 1
+    assert "vpc-brandnew" in capsys.readouterr().out
+
+
+def test_build_import_plan_orders_vpc_first(imp):
+    details = {"vpc-1": {"subnets": [{"id": "subnet-1"}], "route_tables": [{"id": "rtb-1"}]}}
+    plan = imp.build_import_plan(details)
+    assert [item.resource_id for item in plan] == ["vpc-1", "subnet-1", "rtb-1"]
+    assert imp.build_import_plan(details, {plan[1].address}) == [plan[0], plan[2]]
+
+
+def test_managed_addresses_reads_state(imp, child_module):
+    (child_module / "terraform.tfstate").write_text(json.dumps({"resources": [
+        {"module": "module.vpc_resources", "mode": "managed", "type": "aws_subnet", "name": "imported_subnet",
+         "instances": [{"index_key": "subnet-1"}, {"index_key": "subnet-2"}]},
+        {"mode": "data", "type": "aws_vpc", "name": "x", "instances": [{}]},
+    ]}))
+    assert imp.managed_addresses(str(child_module)) == {
+        'module.vpc_resources.aws_subnet.imported_subnet["subnet-1"]',
+        'module.vpc_resources.aws_subnet.imported_subnet["subnet-2"]',
+    }
+
+
+def test_config_paths_resolve_against_their_source(imp, tmp_path, monkeypatch):
+    config_dir = tmp_path / "conf"
+    config_dir.mkdir()
+    config_file = config_dir / "imp.json"
+    config_file.write_text(json.dumps({
+        "child_module": "Child",
+        "resources": "resources.json",
+        "jobs": [{"child_module": "JobChild"}],
+    }))
+    monkeypatch.chdir(tmp_path)
+
+    args = imp.build_parser().parse_args(["--config", "conf/imp.json", "--run-log", "logs/run.jsonl", "import"])
+    config = imp.load_config(args)
+
+    assert config["child_module"] == str(config_dir / "Child")
+    assert config["resources"] == str(config_dir / "resources.json")
+    assert config["jobs"][0]["child_module"] == str(config_dir / "JobChild")
+    assert config["run_log"] == str(tmp_path / "logs" / "run.jsonl")
+    # Defaults stay next to the script, as before the CLI existed
+    assert config["parent_module"] == os.path.join(os.path.dirname(imp.__file__), "Parent_Module")
+
+
+@pytest.mark.parametrize("parent, child, source", [
+    ("Parent_Module", "Child_Module", "../Parent_Module"),
+    ("gen/shared/Parent", "gen/envs/prod", "../../shared/Parent"),
+    ("stack/modules/Parent", "stack", "./modules/Parent"),
+])
+def test_generate_points_child_at_parent_module(imp, tmp_path, monkeypatch, capsys, parent, child, source):
+    monkeypatch.chdir(tmp_path)
+    imp.main(["--parent-module", parent, "--child-module", child, "generate"])
+
+    main_tf = (tmp_path / child / "main.tf").read_text()
+    assert f'source = "{source}"' in main_tf
+    assert (tmp_path / child / source / "main.tf").exists()
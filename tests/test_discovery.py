@@ -0,0 +1,97 @@
+import pytest
+
+
+def test_build_vpc_filters(imp):
+    assert imp.build_vpc_filters(["Env=prod", "Env=dev", "Owner", "Team"], ["10.0.0.0/16"], False) == [
+        {"Name": "tag:Env", "Values": ["prod", "dev"]},
+        {"Name": "tag-key", "Values": ["Owner", "Team"]},
+        {"Name": "cidr-block-association.cidr-block", "Values": ["10.0.0.0/16"]},
+        {"Name": "is-default", "Values": ["false"]},
+    ]
+    assert imp.build_vpc_filters() == []
+
+
+def _known(**vpcs):
+    return {vpc_id: {"vpc": {"cidr_block": "10.0.0.0/16", "tags": tags}} for vpc_id, tags in vpcs.items()}
+
+
+def _config(**overrides):
+    config = {"vpc_ids": [], "tags": [], "cidrs": [], "is_default": None}
+    config.update(overrides)
+    return config
+
+
+def test_select_known_vpcs_ors_values_of_one_tag(imp):
+    known = _known(a={"Env": "prod"}, b={"Env": "dev"}, c={"Env": "qa"})
+    selected = imp.select_known_vpcs(_config(tags=["Env=prod", "Env=dev"]), known)
+    assert sorted(selected) == ["a", "b"]
+
+
+def test_select_known_vpcs_ands_different_filters(imp):
+    known = _known(a={"Env": "prod", "Owner": "x"}, b={"Env": "prod"}, c={"Team": "y", "Env": "prod"})
+    selected = imp.select_known_vpcs(_config(tags=["Env=prod", "Owner", "Team"]), known)
+    assert sorted(selected) == ["a", "c"]
+
+
+@pytest.mark.parametrize("overrides", [{"cidrs": ["10.0.0.0/16"]}, {"is_default": True}])
+def test_select_known_vpcs_refuses_offline_only_selectors(imp, overrides):
+    with pytest.raises(Exception, match="cannot be evaluated offline"):
+        imp.select_known_vpcs(_config(**overrides), _known(a={}))
+
+
+def test_fetch_pushes_selectors_down(imp, fake_ec2):
+    fake_ec2.add_vpc("vpc-prod", tags={"Env": "prod"})
+    fake_ec2.add_vpc("vpc-dev", tags={"Env": "dev"}, extra_cidrs=["100.64.0.0/16"])
+    fake_ec2.add_vpc("vpc-default", tags={"Env": "prod"}, is_default=True)
+
+    filters = imp.build_vpc_filters(["Env=prod", "Env=dev"], is_default=False)
+    details = imp.fetch_vpc_resources([], "us-east-1", filters)
+    assert sorted(details) == ["vpc-dev", "vpc-prod"]
+    assert fake_ec2.calls[0] == ("describe_vpcs", None, filters)
+    # One call per child resource type for the whole batch, not per VPC
+    assert len(fake_ec2.calls) == 6
+    assert details["vpc-dev"]["subnets"][0]["id"] == "subnet-vpc-dev"
+
+    secondary = imp.fetch_vpc_resources([], "us-east-1", imp.build_vpc_filters(cidrs=["100.64.0.0/16"]))
+    assert list(secondary) == ["vpc-dev"]
+
+
+def test_fetch_skips_stale_vpc_ids(imp, fake_ec2, capsys):
+    fake_ec2.add_vpc("vpc-1")
+    fake_ec2.add_vpc("vpc-2")
+
+    details = imp.fetch_vpc_resources(["vpc-1", "vpc-stale", "vpc-2"], "us-east-1")
+    assert sorted(details) == ["vpc-1", "vpc-2"]
+    assert details["vpc-2"]["subnets"][0]["id"] == "subnet-vpc-2"
+    assert "vpc-stale" in capsys.readouterr().out
+
+
+def test_build_vpc_filters_leaves_wide_ranges_to_post_filtering(imp):
+    assert imp.build_vpc_filters(cidrs=["10.0.0.0/8", "172.31.0.0/16"]) == []
+    assert imp.build_vpc_filters(cidrs=["10.0.0.1/16"]) == [
+        {"Name": "cidr-block-association.cidr-block", "Values": ["10.0.0.0/16"]}]
+
+
+@pytest.mark.parametrize("value", ["garbage", "10.0.0.0/33", "2001:db8::/32"])
+def test_build_vpc_filters_rejects_invalid_cidrs(imp, value):
+    with pytest.raises(ValueError, match=repr(value)):
+        imp.build_vpc_filters(cidrs=[value])
+
+
+def test_fetch_matches_cidr_ranges_by_containment(imp, fake_ec2):
+    fake_ec2.add_vpc("vpc-ten", cidr="10.1.0.0/16")
+    fake_ec2.add_vpc("vpc-secondary", cidr="172.16.0.0/16", extra_cidrs=["10.2.0.0/20"])
+    fake_ec2.add_vpc("vpc-other", cidr="192.168.0.0/16")
+
+    cidrs = ["10.0.0.0/8"]
+    details = imp.fetch_vpc_resources([], "us-east-1", imp.build_vpc_filters(cidrs=cidrs), cidrs=cidrs)
+    assert sorted(details) == ["vpc-secondary", "vpc-ten"]
+    # Non-matching VPCs are dropped before the child describes
+    assert all(call[2] is None or "vpc-other" not in call[2][0]["Values"] for call in fake_ec2.calls[1:])
+
+
+def test_invalid_cidr_fails_the_command(imp, capsys):
+    with pytest.raises(SystemExit) as exc:
+        imp.main(["--cidr", "garbage", "import", "--dry-run"])
+    assert exc.value.code == 1
+    assert "Invalid CIDR selector 'garbage'" in capsys.readouterr().out
@@ -0,0 +1,184 @@
+import json
+import multiprocessing
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+
+def test_run_import_jobs_serializes_per_module(imp, tmp_path):
+    active = {}
+    overlap = {"same_module": 0, "max_total": 0}
+    lock = threading.Lock()
+
+    def run_job(job):
+        with lock:
+            active[job["child_module"]] = active.get(job["child_module"], 0) + 1
+            if active[job["child_module"]] > 1:
+                overlap["same_module"] += 1
+            overlap["max_total"] = max(overlap["max_total"], sum(active.values()))
+        time.sleep(0.05)
+        with lock:
+            active[job["child_module"]] -= 1
+
+    jobs = [{"child_module": str(tmp_path / name)} for name in ("A", "B", "A", "C", "A")]
+    assert imp.run_import_jobs(jobs, run_job, max_workers=4) == []
+    assert overlap["same_module"] == 0
+    assert overlap["max_total"] > 1
+
+
+def test_run_import_jobs_reports_failures(imp, tmp_path):
+    def run_job(job):
+        if job["child_module"].endswith("B"):
+            raise RuntimeError("boom")
+
+    jobs = [{"child_module": str(tmp_path / name)} for name in ("A", "B")]
+    [(job, error)] = imp.run_import_jobs(jobs, run_job)
+    assert job["child_module"].endswith("B")
+    assert str(error) == "boom"
+
+
+def _resources_file(tmp_path):
+    path = tmp_path / "resources.json"
+    path.write_text(json.dumps({"vpc-1": {
+        "vpc": {"cidr_block": "10.0.0.0/16", "tags": {}, "enable_dns_support": True, "enable_dns_hostnames": True},
+        "subnets": [{"id": "subnet-1", "cidr_block": "10.0.1.0/24", "availability_zone": "us-east-1a",
+                     "map_public_ip": False, "tags": {}}],
+        "internet_gateways": [], "nat_gateways": [], "security_groups": [], "route_tables": [],
+    }}))
+    return str(path)
+
+
+def _install_fake_terraform(tmp_path, monkeypatch, body):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "terraform"
+    script.write_text("#!/bin/sh\n" + body + "\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return tmp_path / "calls.log"
+
+
+def _import_argv(tmp_path):
+    return ["--run-log", str(tmp_path / "run.jsonl"), "--resources", _resources_file(tmp_path),
+            "--parent-module", str(tmp_path / "Parent_Module"), "--child-module", str(tmp_path / "Child_Module"),
+            "import"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell script as terraform")
+def test_import_exits_non_zero_when_terraform_import_fails(imp, tmp_path, monkeypatch, capsys):
+    calls = _install_fake_terraform(tmp_path, monkeypatch, f"""
+echo "$1" >> {tmp_path}/calls.log
+[ "$1" = init ] && exit 0
+echo "Error: Cannot import non-existent remote object"
+exit 1""")
+    with pytest.raises(SystemExit) as exc:
+        imp.main(_import_argv(tmp_path))
+    assert exc.value.code == 1
+    out = capsys.readouterr().out
+    assert "1 of 2 import(s) failed" in out
+    assert "skipped 1 dependent resource(s)" in out
+    assert calls.read_text().split() == ["init", "import"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell script as terraform")
+def test_import_exits_non_zero_when_init_fails(imp, tmp_path, monkeypatch, capsys):
+    _install_fake_terraform(tmp_path, monkeypatch, "exit 1")
+    with pytest.raises(SystemExit) as exc:
+        imp.main(_import_argv(tmp_path))
+    assert exc.value.code == 1
+    assert "Terraform initialization failed" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell script as terraform")
+def test_import_succeeds_when_every_import_succeeds(imp, tmp_path, monkeypatch):
+    _install_fake_terraform(tmp_path, monkeypatch, 'echo "Import successful!"')
+    imp.main(_import_argv(tmp_path))
+
+
+def test_import_exits_non_zero_when_a_job_raises(imp, tmp_path):
+    argv = ["--run-log", str(tmp_path / "run.jsonl"), "--region", "us-east-1", "--region", "eu-west-1", "import"]
+    with pytest.raises(SystemExit) as exc:
+        imp.main(argv)
+    assert exc.value.code == 1
+
+
+def test_atomic_write_uses_umask_default_for_new_files(imp, tmp_path):
+    path = tmp_path / "terraform.tfvars"
+    imp.atomic_write(str(path), "a = 1\n")
+    assert path.read_text() == "a = 1\n"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~imp._UMASK
+    assert [p.name for p in tmp_path.iterdir()] == ["terraform.tfvars"]
+
+
+def test_atomic_write_keeps_existing_mode(imp, tmp_path):
+    path = tmp_path / "main.tf"
+    path.write_text("old")
+    os.chmod(path, 0o640)
+    imp.atomic_write(str(path), "new")
+    assert path.read_text() == "new"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def _fork_context():
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork to share the loaded script with child processes")
+    return multiprocessing.get_context("fork")
+
+
+def _hold_lock(imp, path, ready, hold):
+    with imp.file_lock(path):
+        ready.set()
+        time.sleep(hold)
+
+
+def test_file_lock_serializes_processes(imp, tmp_path):
+    ctx = _fork_context()
+    path = str(tmp_path / "terraform.tfvars")
+    ready = ctx.Event()
+    child = ctx.Process(target=_hold_lock, args=(imp, path, ready, 0.3))
+    child.start()
+    assert ready.wait(5)
+    start = time.monotonic()
+    with imp.file_lock(path):
+        waited = time.monotonic() - start
+    child.join()
+    assert waited > 0.1
+
+
+def _write_events(imp, log_path, worker, count):
+    run_log = imp.RunLog(log_path, max_bytes=2000, backup_count=100)
+    for i in range(count):
+        run_log.record(imp.TerraformEvent(type="log", command=f"worker-{worker}", message=f"{worker}:{i}"))
+    run_log.close()
+
+
+def test_run_log_rotation_is_safe_across_processes(imp, tmp_path):
+    ctx = _fork_context()
+    log_path = str(tmp_path / "run.jsonl")
+    workers = [ctx.Process(target=_write_events, args=(imp, log_path, worker, 150)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    messages = [event["message"] for event in imp.read_run_log(log_path)]
+    assert len(messages) == 450
+    assert len(set(messages)) == 450
+    assert len(list(tmp_path.glob("run.jsonl.*.gz"))) > 1
+
+
+
+@pytest.mark.parametrize("job, region, regions", [
+    ({"regions": ["eu-west-1"]}, "eu-west-1", ["eu-west-1"]),
+    ({"region": "ap-south-1"}, "ap-south-1", ["ap-south-1"]),
+    ({}, "us-east-1", ["us-east-1"]),
+])
+def test_job_config_region_follows_job_regions(imp, job, region, regions):
+    base = {"region": "us-east-1", "regions": ["us-east-1"], "tags": [], "cidrs": [], "is_default": None}
+    merged = imp.job_config(base, {"child_module": "/tmp/A", **job})
+    assert (merged["region"], merged["regions"]) == (region, regions)
@@ -0,0 +1,186 @@
+import json
+import sys
+import time
+
+import pytest
+
+
+@pytest.mark.parametrize("command, expected", [
+    (["terraform", "plan"], ["terraform", "plan", "-json"]),
+    (["terraform", "refresh"], ["terraform", "refresh", "-json"]),
+    (["terraform", "apply"], ["terraform", "apply"]),
+    (["terraform", "destroy"], ["terraform", "destroy"]),
+    (["terraform", "apply", "-auto-approve"], ["terraform", "apply", "-json", "-auto-approve"]),
+    (["terraform", "apply", "tfplan"], ["terraform", "apply", "-json", "tfplan"]),
+    (["terraform", "destroy", "-auto-approve"], ["terraform", "destroy", "-json", "-auto-approve"]),
+    (["terraform", "import", "aws_vpc.a", "vpc-1"], ["terraform", "import", "aws_vpc.a", "vpc-1"]),
+    (["terraform", "plan", "-json"], ["terraform", "plan", "-json"]),
+])
+def test_with_json_flag(imp, command, expected):
+    assert imp._with_json_flag(command) == expected
+
+
+ADDRESS = 'module.vpc_resources.aws_vpc.imported_vpc["vpc-1"]'
+IMPORT = f"terraform import {ADDRESS} vpc-1"
+
+
+def test_parse_text_event_import_lines(imp):
+    start = imp.parse_text_event(f'\x1b[0m\x1b[1m{ADDRESS}: Importing from ID "vpc-1"...\x1b[0m', IMPORT)
+    assert (start.type, start.address, start.level) == ("import_start", ADDRESS, "info")
+
+    done = imp.parse_text_event("Import successful!", IMPORT, ADDRESS)
+    assert (done.type, done.address) == ("import_complete", ADDRESS)
+
+
+def test_parse_text_event_boxed_error(imp):
+    event = imp.parse_text_event("\u2502 Error: Cannot import non-existent remote object", IMPORT, ADDRESS)
+    assert (event.type, event.level, event.address) == ("diagnostic", "error", ADDRESS)
+    assert event.message == "Cannot import non-existent remote object"
+    assert imp.parse_text_event("\u2577", IMPORT, ADDRESS) is None
+
+
+def test_parse_json_event_diagnostic(imp):
+    line = json.dumps({
+        "@level": "error", "@message": "Error: boom", "type": "diagnostic",
+        "diagnostic": {"severity": "error", "summary": "boom", "detail": "why", "address": ADDRESS},
+    })
+    event = imp.parse_json_event(line, "terraform plan -json")
+    assert (event.type, event.level, event.address, event.message, event.detail) == (
+        "diagnostic", "error", ADDRESS, "boom", "why")
+
+
+def test_parse_json_event_import_hook(imp):
+    line = json.dumps({"type": "apply_complete", "hook": {"resource": {"addr": ADDRESS}, "action": "import"}})
+    event = imp.parse_json_event(line, "terraform apply -json -auto-approve")
+    assert (event.type, event.address) == ("import_complete", ADDRESS)
+    assert imp.parse_json_event("not json", "terraform plan -json") is None
+
+
+def _error(imp, message="boom"):
+    return imp.TerraformEvent(type="diagnostic", command=IMPORT, address=ADDRESS, level="error", message=message)
+
+
+def test_run_log_persists_failure_index(imp, tmp_path):
+    log_path = str(tmp_path / "run.jsonl")
+    run_log = imp.RunLog(log_path)
+    run_log.start(IMPORT)
+    run_log.record(_error(imp))
+    run_log.close()
+
+    index = imp.load_failure_index(log_path)
+    assert [event["message"] for event in index[ADDRESS]] == ["boom"]
+    assert [event["type"] for event in imp.read_run_log(log_path, address=ADDRESS)] == ["diagnostic"]
+
+    # A later successful import clears the address from the index
+    run_log = imp.RunLog(log_path)
+    run_log.record(imp.TerraformEvent(type="import_complete", command=IMPORT, address=ADDRESS))
+    run_log.close()
+    assert ADDRESS not in imp.load_failure_index(log_path)
+
+
+def test_run_log_finish_records_silent_failure(imp, tmp_path):
+    log_path = str(tmp_path / "run.jsonl")
+    run_log = imp.RunLog(log_path)
+    run_log.start(IMPORT)
+    run_log.record(imp.TerraformEvent(type="log", command=IMPORT, address=ADDRESS, message="last words"))
+    run_log.finish(IMPORT, "", ok=False, address=ADDRESS)
+    run_log.close()
+
+    [failure] = run_log.diagnostics(ADDRESS)
+    assert failure.type == "command_failed"
+    assert failure.detail == "last words"
+
+
+def test_run_log_rotates_into_gzip_segments(imp, tmp_path):
+    log_path = str(tmp_path / "run.jsonl")
+    run_log = imp.RunLog(log_path, max_bytes=400, backup_count=2)
+    for i in range(20):
+        run_log.record(imp.TerraformEvent(type="log", command=IMPORT, message=f"line {i}"))
+    run_log.close()
+
+    assert sorted(p.name for p in tmp_path.glob("run.jsonl.*.gz")) == ["run.jsonl.1.gz", "run.jsonl.2.gz"]
+    messages = [event["message"] for event in imp.read_run_log(log_path)]
+    assert messages == sorted(messages, key=lambda m: int(m.split()[1]))
+    assert messages[-1] == "line 19"
+
+
+def test_log_failed_subcommand(imp, tmp_path, capsys):
+    log_path = str(tmp_path / "run.jsonl")
+    run_log = imp.RunLog(log_path)
+    run_log.record(_error(imp, "not found"))
+    run_log.close()
+
+    imp.main(["--run-log", log_path, "log", "--failed", "--address", ADDRESS])
+    [line] = capsys.readouterr().out.splitlines()
+    assert json.loads(line)["message"] == "not found"
+
+
+def _fake_terraform(tmp_path, body):
+    script = tmp_path / "terraform"
+    script.write_text("#!/bin/sh\n" + body + "\n")
+    script.chmod(0o755)
+    return str(script)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell script as terraform")
+@pytest.mark.parametrize("body", [
+    "echo started; sleep 30",                  # grandchild keeps stdout open after SIGTERM
+    "trap '' TERM; echo started; sleep 30",    # ignores SIGTERM, needs SIGKILL
+])
+def test_run_terraform_command_enforces_timeout(imp, tmp_path, monkeypatch, body):
+    monkeypatch.setattr(imp, "TERMINATE_GRACE_SECONDS", 0.5)
+    terraform = _fake_terraform(tmp_path, body)
+    run_log = imp.RunLog(str(tmp_path / "run.jsonl"))
+
+    start = time.monotonic()
+    assert imp.run_terraform_command([terraform, "import", ADDRESS, "vpc-1"], str(tmp_path),
+                                     timeout=1, run_log=run_log) is False
+    assert time.monotonic() - start < 5
+    run_log.close()
+
+    [failure] = run_log.diagnostics(ADDRESS)
+    assert (failure.type, failure.detail) == ("command_failed", "started")
+
+
+BOXED_ERROR = [
+    "\u2577\n",
+    "\u2502 Error: Cannot import non-existent remote object\n",
+    "\u2502 \n",
+    "\u2502 While attempting to import an existing object to \"aws_vpc.x\", the provider\n",
+    "\u2502 detected that no object exists with the given id.\n",
+    "\u2575\n",
+    "Releasing state lock.\n",
+]
+
+
+def test_text_event_parser_collects_boxed_detail(imp):
+    parser = imp.TextEventParser(IMPORT, ADDRESS)
+    events = [event for line in BOXED_ERROR for event in parser.feed(line)] + parser.close()
+
+    diagnostic, log = events
+    assert (diagnostic.type, diagnostic.level, diagnostic.address) == ("diagnostic", "error", ADDRESS)
+    assert diagnostic.message == "Cannot import non-existent remote object"
+    assert diagnostic.detail == ('While attempting to import an existing object to "aws_vpc.x", the provider\n'
+                                 "detected that no object exists with the given id.")
+    assert log.message == "Releasing state lock."
+
+
+def test_text_event_parser_flushes_unclosed_box(imp):
+    parser = imp.TextEventParser(IMPORT, ADDRESS)
+    assert [event for line in BOXED_ERROR[:4] for event in parser.feed(line)] == []
+    [diagnostic] = parser.close()
+    assert diagnostic.detail.startswith("While attempting")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell script as terraform")
+def test_failed_import_detail_reaches_failure_index(imp, tmp_path):
+    body = "cat <<'EOF'\n" + "".join(BOXED_ERROR) + "EOF\nexit 1"
+    terraform = _fake_terraform(tmp_path, body)
+    log_path = str(tmp_path / "run.jsonl")
+    run_log = imp.RunLog(log_path)
+    assert imp.run_terraform_command([terraform, "import", ADDRESS, "vpc-1"], str(tmp_path), run_log=run_log) is False
+    run_log.close()
+
+    [entry] = imp.load_failure_index(log_path)[ADDRESS]
+    assert entry["message"] == "Cannot import non-existent remote object"
+    assert entry["detail"].endswith("no object exists with the given id.")